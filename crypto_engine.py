@@ -4,7 +4,7 @@ CipherSearch Core Engine
 Implements Searchable Symmetric Encryption (SSE):
 - AES-256-GCM for document encryption
 - HMAC-SHA256 for deterministic search token generation
-- PBKDF2 for key derivation from master password
+- PBKDF2 + HKDF-Expand for key derivation from master password
 - SQLite-backed encrypted index for server-side storage
 
 Security model: The SecureServer class NEVER receives keys or plaintext.
@@ -12,18 +12,40 @@ Security model: The SecureServer class NEVER receives keys or plaintext.
 
 import os
 import re
-import hmac
 import json
 import time
 import hashlib
 import base64
+import binascii
 import sqlite3
+import threading
+from collections import defaultdict, deque
 from datetime import datetime
-from typing import List, Dict, Tuple, Optional
-from dataclasses import dataclass, field
-from cryptography.hazmat.primitives.ciphers.aead import AESGCM
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
-from cryptography.hazmat.primitives import hashes
+from functools import lru_cache
+from itertools import islice
+from typing import List, Dict, Tuple, Optional, Deque
+from dataclasses import dataclass
+# cryptography (the OpenSSL bindings) is imported inside CipherSearchEngine
+# only: the server side and UI pages that never encrypt don't load it.
+
+# Keyword tokenizer, compiled once at import (3+ ASCII alphanumeric characters);
+# matches are lowercased afterwards, so the text itself is never lowered.
+_KEYWORD_RE = re.compile(r'\b[A-Za-z0-9]{3,}\b')
+# Any whitespace (same set as str.isspace); such n-gram input needs per-gram strips
+_WHITESPACE_RE = re.compile(r'\s')
+
+
+def _hmac_sha256_states(key: bytes):
+    """
+    Precomputed HMAC-SHA256 (RFC 2104) states: sha256(key ^ ipad) and
+    sha256(key ^ opad). HMAC(key, m) = outer.copy() <- inner.copy() <- m.
+    """
+    if len(key) > 64:
+        key = hashlib.sha256(key).digest()
+    key = key.ljust(64, b"\0")
+    inner = hashlib.sha256(bytes(b ^ 0x36 for b in key))
+    outer = hashlib.sha256(bytes(b ^ 0x5C for b in key))
+    return inner, outer
 
 # ---------------------------------------------------------------------------
 # Data classes
@@ -33,9 +55,9 @@ from cryptography.hazmat.primitives import hashes
 class EncryptedDocument:
     """What the server receives — no plaintext anywhere."""
     doc_id: str
-    encrypted_content: str  # base64-encoded AES-GCM ciphertext
-    nonce: str  # base64-encoded 96-bit nonce
-    tokens: List[str]  # HMAC-SHA256 search tokens (opaque to server)
+    encrypted_content: bytes  # raw AES-GCM ciphertext (tag appended)
+    nonce: bytes  # raw 96-bit nonce
+    tokens: List[bytes]  # raw 32-byte HMAC-SHA256 search tokens (opaque to server)
     keyword_count: int
     timestamp: str
 
@@ -44,8 +66,8 @@ class EncryptedDocument:
 class SearchResult:
     """Encrypted search result returned by server."""
     doc_id: str
-    encrypted_content: str
-    nonce: str
+    encrypted_content: bytes
+    nonce: bytes
 
 
 # ---------------------------------------------------------------------------
@@ -82,26 +104,80 @@ class CipherSearchEngine:
         - search_key: for HMAC-SHA256 search token generation
 
         Using separate keys ensures that compromising one doesn't compromise
-        the other (key separation principle).
+        the other (key separation principle). The password is stretched by
+        PBKDF2 once; each key is then a cheap HKDF-Expand under its own label.
         """
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM
         self.salt = salt or os.urandom(16)
-        self.data_key = self._derive_key(master_password, b"ciphersearch:data")
-        self.search_key = self._derive_key(master_password, b"ciphersearch:search")
+        master_key = self._stretch_password(master_password)
+        self.data_key = self._derive_key(master_key, b"ciphersearch:data")
+        self.search_key = self._derive_key(master_key, b"ciphersearch:search")
+        # One AESGCM per engine, reused by every encrypt/decrypt call. It holds
+        # no per-message state, so concurrent use from session threads is
+        # safe; never rebuild it per call. AESGCM is already
+        # the one-shot OpenSSL EVP AEAD (AES-NI/VAES + CLMUL where available);
+        # the streaming Cipher(AES, GCM) API reaches the same kernels but pays
+        # for an encryptor object and update/finalize calls per message.
         self._aesgcm = AESGCM(self.data_key)
-
-    def _derive_key(self, password: str, context: bytes) -> bytes:
-        """PBKDF2-HMAC-SHA256 key derivation with contextual salt."""
+        # Pre-drawn random nonces, handed out once each (see _take_nonces)
+        self._nonce_lock = threading.Lock()
+        self._nonce_pool = b""
+        self._nonce_off = 0
+        self._nonce_pid = os.getpid()
+        # HMAC-SHA256 inner/outer states with the key pads already absorbed;
+        # tokens resume from copies instead of re-keying per call.
+        self._hmac_inner, self._hmac_outer = _hmac_sha256_states(self.search_key)
+        # Inner state with the constant "ngram:" prefix absorbed as well.
+        self._ngram_inner = self._hmac_inner.copy()
+        self._ngram_inner.update(b"ngram:")
+        # Per-engine memo of normalized keyword -> token. Lives and dies with
+        # this engine (and its key), so nothing is shared across logins.
+        self._keyword_token = lru_cache(maxsize=self.TOKEN_CACHE_SIZE)(
+            lambda normalized: self._mac(normalized.encode('utf-8')))
+
+    def _stretch_password(self, password: str) -> bytes:
+        """PBKDF2-HMAC-SHA256 master key from the password (the only slow step)."""
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
         kdf = PBKDF2HMAC(
             algorithm=hashes.SHA256(),
             length=32,  # 256 bits
-            salt=self.salt + context,
+            salt=self.salt,
             iterations=100_000,
         )
         return kdf.derive(password.encode('utf-8'))
 
+    @staticmethod
+    def _derive_key(master_key: bytes, context: bytes) -> bytes:
+        """HKDF-Expand (SHA-256) a 256-bit subkey for one context label."""
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.kdf.hkdf import HKDFExpand
+        return HKDFExpand(algorithm=hashes.SHA256(), length=32, info=context).derive(master_key)
+
     # --- Encryption / Decryption ---
 
-    def encrypt_text(self, plaintext: str, doc_id: str) -> Tuple[str, str]:
+    NONCE_POOL_SIZE = 1024  # nonces drawn per os.urandom refill
+
+    def _take_nonces(self, count: int) -> bytes:
+        """
+        count fresh 96-bit nonces, concatenated. Served from a pool refilled by
+        one os.urandom call per NONCE_POOL_SIZE nonces. Every byte is handed out
+        at most once (lock), and a forked child discards the inherited pool so
+        it can never replay the parent's nonces.
+        """
+        need = 12 * count
+        with self._nonce_lock:
+            if self._nonce_pid != os.getpid():
+                self._nonce_pool, self._nonce_off = b"", 0
+                self._nonce_pid = os.getpid()
+            if self._nonce_off + need > len(self._nonce_pool):
+                self._nonce_pool = os.urandom(max(need, 12 * self.NONCE_POOL_SIZE))
+                self._nonce_off = 0
+            chunk = self._nonce_pool[self._nonce_off:self._nonce_off + need]
+            self._nonce_off += need
+        return chunk
+
+    def encrypt_raw(self, plaintext: str, doc_id: str) -> Tuple[bytes, bytes]:
         """
         Encrypt plaintext using AES-256-GCM.
 
@@ -111,26 +187,36 @@ class CipherSearchEngine:
                     to this document, preventing ciphertext swapping attacks.
 
         Returns:
-            (ciphertext_base64, nonce_base64)
+            (ciphertext, nonce) as raw bytes
         """
-        nonce = os.urandom(12)  # 96-bit nonce for GCM
+        nonce = self._take_nonces(1)  # 96-bit nonce for GCM
         ciphertext = self._aesgcm.encrypt(
             nonce,
             plaintext.encode('utf-8'),
             doc_id.encode('utf-8')  # AAD
         )
-        return (
-            base64.b64encode(ciphertext).decode('ascii'),
-            base64.b64encode(nonce).decode('ascii'),
-        )
+        return ciphertext, nonce
 
-    def decrypt_text(self, ciphertext_b64: str, nonce_b64: str, doc_id: str) -> str:
+    def encrypt_many(self, plaintexts: List[str], doc_ids: List[str]) -> List[Tuple[bytes, bytes]]:
+        """
+        encrypt_raw() for a batch: every 96-bit nonce comes from one pool
+        slice, then a single tight loop over AESGCM.encrypt.
+        Returns [(ciphertext, nonce), ...] in input order.
         """
-        Decrypt ciphertext using AES-256-GCM.
+        pool = self._take_nonces(len(plaintexts))
+        encrypt = self._aesgcm.encrypt
+        out = []
+        for i, (plaintext, doc_id) in enumerate(zip(plaintexts, doc_ids)):
+            nonce = pool[12 * i:12 * i + 12]
+            out.append((encrypt(nonce, plaintext.encode('utf-8'), doc_id.encode('utf-8')),
+                        nonce))
+        return out
+
+    def decrypt_raw(self, ciphertext: bytes, nonce: bytes, doc_id: str) -> str:
+        """
+        Decrypt raw ciphertext using AES-256-GCM.
         Verifies integrity (GCM tag) and AAD binding automatically.
         """
-        ciphertext = base64.b64decode(ciphertext_b64)
-        nonce = base64.b64decode(nonce_b64)
         plaintext = self._aesgcm.decrypt(
             nonce,
             ciphertext,
@@ -138,9 +224,44 @@ class CipherSearchEngine:
         )
         return plaintext.decode('utf-8')
 
+    def decrypt_many(self, rows: List[Dict]) -> List[Optional[str]]:
+        """
+        Decrypt server result rows (doc_id / encrypted_content / nonce) in one
+        tight loop. A row that fails GCM authentication yields None instead of
+        aborting the batch.
+        """
+        from cryptography.exceptions import InvalidTag
+        decrypt = self._aesgcm.decrypt
+        out = []
+        for r in rows:
+            try:
+                out.append(decrypt(r['nonce'], r['encrypted_content'],
+                                   r['doc_id'].encode('utf-8')).decode('utf-8'))
+            except InvalidTag:
+                out.append(None)
+        return out
+
+    def encrypt_text(self, plaintext: str, doc_id: str) -> Tuple[str, str]:
+        """encrypt_raw(), returning (ciphertext_base64, nonce_base64)."""
+        ciphertext, nonce = self.encrypt_raw(plaintext, doc_id)
+        return (
+            binascii.b2a_base64(ciphertext, newline=False).decode('ascii'),
+            binascii.b2a_base64(nonce, newline=False).decode('ascii'),
+        )
+
+    def decrypt_text(self, ciphertext_b64: str, nonce_b64: str, doc_id: str) -> str:
+        """decrypt_raw() for base64-encoded ciphertext and nonce."""
+        return self.decrypt_raw(
+            binascii.a2b_base64(ciphertext_b64),
+            binascii.a2b_base64(nonce_b64),
+            doc_id,
+        )
+
     # --- Search Token Generation ---
 
-    def generate_token(self, keyword: str) -> str:
+    TOKEN_CACHE_SIZE = 8192  # hot keywords remembered per engine
+
+    def generate_token(self, keyword: str) -> bytes:
         """
         Generate a deterministic search token using HMAC-SHA256.
 
@@ -151,56 +272,140 @@ class CipherSearchEngine:
 
         The server sees only the token, never the keyword.
         """
-        normalized = keyword.lower().strip()
-        token_bytes = hmac.new(
-            self.search_key,
-            normalized.encode('utf-8'),
-            hashlib.sha256
-        ).digest()
-        return base64.urlsafe_b64encode(token_bytes).decode('ascii')
+        return self._keyword_token(keyword.lower().strip())
 
-    def generate_ngram_tokens(self, keyword: str, n: int = 3) -> List[str]:
+    def _mac(self, message: bytes) -> bytes:
+        """HMAC-SHA256(search_key, message) as the raw 32-byte digest."""
+        inner = self._hmac_inner.copy()
+        inner.update(message)
+        outer = self._hmac_outer.copy()
+        outer.update(inner.digest())
+        return outer.digest()
+
+    def generate_ngram_tokens(self, keyword: str, n: int = 3) -> List[bytes]:
         """
         Generate n-gram tokens for fuzzy/substring matching.
         "diabetes" → ["$$d", "$di", "dia", "iab", "abe", "bet", "ete", "tes", "es$", "s$$"]
 
         Each n-gram gets its own HMAC token. Documents are matched if a threshold
-        (e.g., 60%) of n-gram tokens match.
+        (e.g., 60%) of n-gram tokens match. Tokens equal generate_token("ngram:" +
+        gram), including its strip() of a gram's trailing whitespace.
+        """
+        normalized = keyword.lower().strip()
+        if normalized.isascii() and not _WHITESPACE_RE.search(normalized):
+            # One byte per character and nothing to strip: encode once and
+            # slice bytes directly. Multi-word queries take the path below.
+            raw = b"$$" + normalized.encode('ascii') + b"$$"
+            grams = [raw[i:i+n] for i in range(len(raw) - n + 1)]
+        else:
+            # Character n-grams, so multi-byte letters are never split. Each
+            # gram is rstripped, as generate_token("ngram:" + gram) strips it.
+            padded = f"$${normalized}$$"
+            grams = [padded[i:i+n].rstrip().encode('utf-8') for i in range(len(padded) - n + 1)]
+        return self._mac_many(self._ngram_inner, grams)
+
+    def _mac_many(self, inner_state, messages: List[bytes]) -> List[bytes]:
+        """_mac() over many messages, resuming from an already-prefixed inner state."""
+        inner_copy, outer_copy = inner_state.copy, self._hmac_outer.copy
+        out = []
+        for msg in messages:
+            inner = inner_copy()
+            inner.update(msg)
+            outer = outer_copy()
+            outer.update(inner.digest())
+            out.append(outer.digest())
+        return out
+
+    def generate_tokens_batch(self, keywords: List[str]) -> Dict[str, Tuple[List[bytes], bytes]]:
+        """
+        Tokenize many keywords in one call: {keyword: (ngram_tokens, keyword_token)}.
+        Every token is cut from the same pre-keyed HMAC state, so the batch pays
+        the key schedule once instead of once per token.
+        """
+        return {kw: (self.generate_ngram_tokens(kw), token)
+                for kw, token in zip(keywords, self.generate_tokens(keywords))}
+
+    def generate_tokens(self, keywords: List[str], cache: bool = True) -> List[bytes]:
         """
-        padded = f"$${keyword.lower().strip()}$$"
-        ngrams = [padded[i:i+n] for i in range(len(padded) - n + 1)]
-        return [self.generate_token(f"ngram:{ng}") for ng in ngrams]
+        generate_token() for a list of keywords, in order, in one tight loop.
+        cache=False bypasses the keyword memo and computes every HMAC afresh
+        (same tokens; used by the benchmark to time real HMAC-SHA256 work).
+        """
+        if not cache:
+            return self._mac_many(self._hmac_inner,
+                                  [kw.lower().strip().encode('utf-8') for kw in keywords])
+        token = self._keyword_token
+        return [token(kw.lower().strip()) for kw in keywords]
 
     # --- Keyword Extraction ---
 
     def extract_keywords(self, text: str) -> List[str]:
-        """Extract searchable keywords from text (remove stop words, normalize)."""
-        words = re.findall(r'\b[a-zA-Z0-9]{3,}\b', text.lower())
-        return sorted(set(w for w in words if w not in self.STOP_WORDS))
+        """
+        Extract searchable keywords from text (remove stop words, normalize),
+        de-duplicated in order of first appearance.
+        """
+        # Match case-insensitively and lowercase only the (short) matches, not
+        # the whole text. dict.fromkeys dedups in O(n); the stop-word test then
+        # runs once per distinct word rather than once per occurrence.
+        stop = self.STOP_WORDS
+        words = dict.fromkeys(map(str.lower, _KEYWORD_RE.findall(text)))
+        return [w for w in words if w not in stop]
 
     # --- High-Level Operations ---
 
-    def encrypt_document(self, doc_id: str, content: str) -> EncryptedDocument:
+    def encrypt_document(self, doc_id: str, content: str,
+                         keywords: Optional[List[str]] = None) -> EncryptedDocument:
         """
         Full pipeline: extract keywords → generate tokens → encrypt content.
         Returns an EncryptedDocument that can be safely sent to the server.
+        Pass `keywords` when the caller already ran extract_keywords(content).
         """
         # Encrypt content
-        ct_b64, nonce_b64 = self.encrypt_text(content, doc_id)
+        ciphertext, nonce = self.encrypt_raw(content, doc_id)
 
         # Extract keywords and generate tokens
-        keywords = self.extract_keywords(content)
-        tokens = [self.generate_token(kw) for kw in keywords]
+        if keywords is None:
+            keywords = self.extract_keywords(content)
+        # Sorted by token value, so the order the server sees carries no hint
+        # of where (or in which alphabetical rank) a keyword occurred
+        tokens = sorted(self.generate_tokens(keywords))
 
         return EncryptedDocument(
             doc_id=doc_id,
-            encrypted_content=ct_b64,
-            nonce=nonce_b64,
+            encrypted_content=ciphertext,
+            nonce=nonce,
             tokens=tokens,
             keyword_count=len(keywords),
             timestamp=datetime.now().isoformat(),
         )
 
+    def encrypt_documents(self, docs: Dict[str, str],
+                          keywords: Optional[Dict[str, List[str]]] = None) -> List[EncryptedDocument]:
+        """
+        encrypt_document() for {doc_id: content}: one nonce-pool slice and one
+        encrypt_many() pass for the whole batch. Each document keeps its own
+        ciphertext, nonce and doc_id AAD, so rows stay independently decryptable.
+        `keywords` optionally maps doc_id to already-extracted keywords.
+        """
+        keywords = keywords or {}
+        doc_ids = list(docs)
+        sealed = self.encrypt_many([docs[d] for d in doc_ids], doc_ids)
+        now = datetime.now().isoformat()
+        out = []
+        for doc_id, (ciphertext, nonce) in zip(doc_ids, sealed):
+            kws = keywords.get(doc_id)
+            if kws is None:
+                kws = self.extract_keywords(docs[doc_id])
+            out.append(EncryptedDocument(
+                doc_id=doc_id,
+                encrypted_content=ciphertext,
+                nonce=nonce,
+                tokens=sorted(self.generate_tokens(kws)),
+                keyword_count=len(kws),
+                timestamp=now,
+            ))
+        return out
+
     def get_salt_b64(self) -> str:
         """Return salt as base64 (for key reconstruction)."""
         return base64.b64encode(self.salt).decode('ascii')
@@ -228,194 +433,382 @@ class SecureServer:
     - Return encrypted results
     """
 
+    AUDIT_LOG_SIZE = 10_000  # ring buffer: oldest events drop off beyond this
+
     def __init__(self, db_path: str = "ciphersearch.db"):
         self.db_path = db_path
-        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        # One server is shared by every Streamlit session thread: public
+        # methods hold this lock so the connection, the postings mirrors and
+        # the audit log are never touched by two sessions at once.
+        self._lock = threading.RLock()
+        # timeout = busy_timeout: wait out a concurrent writer instead of failing
+        # Every query below uses fixed SQL text, so each is prepared once and
+        # then served from the per-connection statement cache.
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=60,
+                                    cached_statements=256)
         self.conn.row_factory = sqlite3.Row
+        # WAL + NORMAL: one fsync per checkpoint instead of per commit
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('PRAGMA cache_size=-65536')    # 64 MB page cache
+        self.conn.execute('PRAGMA temp_store=MEMORY')
+        self.conn.execute('PRAGMA mmap_size=268435456')  # 256 MB memory-mapped reads
         self._init_db()
-        self.audit_log: List[Dict] = []
+        self.conn.execute('PRAGMA foreign_keys=ON')
+        # Refresh planner statistics (ANALYZE) only for tables that need it
+        self.conn.execute('PRAGMA optimize')
+        # Raw (time.time(), action, details) records; formatted only when read
+        self.audit_log: Deque[Tuple[float, str, Dict]] = deque(maxlen=self.AUDIT_LOG_SIZE)
+        # Bumped on every write; lets callers cache reads until data changes.
+        self.revision = 0
+        # In-memory mirrors of search_index / ngram_index (token -> documents.id);
+        # SQLite stays the persistent copy, queries are answered from these.
+        # The _doc_* maps are the reverse direction (documents.id -> tokens), so
+        # re-uploads and deletes touch only that document's postings.
+        self._postings: Dict[bytes, set] = defaultdict(set)
+        self._doc_tokens: Dict[int, set] = defaultdict(set)
+        for row in self.conn.execute('SELECT token, doc_ref FROM search_index'):
+            self._postings[row['token']].add(row['doc_ref'])
+            self._doc_tokens[row['doc_ref']].add(row['token'])
+        self._ngram_postings: Dict[bytes, set] = defaultdict(set)
+        self._doc_ngrams: Dict[int, set] = defaultdict(set)
+        for row in self.conn.execute('SELECT token, doc_ref FROM ngram_index'):
+            self._ngram_postings[row['token']].add(row['doc_ref'])
+            self._doc_ngrams[row['doc_ref']].add(row['token'])
+
+    # documents.id is the compact integer key the index tables point at;
+    # doc_id stays the client-facing name.
+    SCHEMA = (
+        '''CREATE TABLE IF NOT EXISTS documents (
+            id INTEGER PRIMARY KEY,
+            doc_id TEXT NOT NULL UNIQUE,
+            encrypted_content BLOB NOT NULL,
+            nonce BLOB NOT NULL,
+            keyword_count INTEGER,
+            created_at TEXT
+        )''',
+        '''CREATE TABLE IF NOT EXISTS search_index (
+            id INTEGER PRIMARY KEY,
+            token BLOB NOT NULL,
+            doc_ref INTEGER NOT NULL REFERENCES documents(id) ON DELETE CASCADE
+        )''',
+        '''CREATE TABLE IF NOT EXISTS ngram_index (
+            id INTEGER PRIMARY KEY,
+            token BLOB NOT NULL,
+            doc_ref INTEGER NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+            source_keyword_hash BLOB
+        )''',
+    )
+    # Covering indexes: token lookups and postings scans read doc_ref straight
+    # from the index, never from the table rows. Created after _migrate(),
+    # since older layouts have no doc_ref column yet.
+    INDEXES = (
+        'CREATE INDEX IF NOT EXISTS idx_token_doc ON search_index(token, doc_ref)',
+        'CREATE INDEX IF NOT EXISTS idx_ngram_doc ON ngram_index(token, doc_ref)',
+    )
 
     def _init_db(self):
         c = self.conn.cursor()
-        c.execute('''CREATE TABLE IF NOT EXISTS documents (
-            doc_id TEXT PRIMARY KEY,
-            encrypted_content TEXT NOT NULL,
-            nonce TEXT NOT NULL,
-            keyword_count INTEGER,
-            created_at TEXT
-        )''')
-        c.execute('''CREATE TABLE IF NOT EXISTS search_index (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            token TEXT NOT NULL,
-            doc_id TEXT NOT NULL,
-            FOREIGN KEY (doc_id) REFERENCES documents(doc_id) ON DELETE CASCADE
-        )''')
-        c.execute('CREATE INDEX IF NOT EXISTS idx_token ON search_index(token)')
-        c.execute('''CREATE TABLE IF NOT EXISTS ngram_index (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            token TEXT NOT NULL,
-            doc_id TEXT NOT NULL,
-            source_keyword_hash TEXT,
-            FOREIGN KEY (doc_id) REFERENCES documents(doc_id) ON DELETE CASCADE
-        )''')
-        c.execute('CREATE INDEX IF NOT EXISTS idx_ngram ON ngram_index(token)')
+        for statement in self.SCHEMA:
+            c.execute(statement)
+        self.conn.commit()
+        self._migrate()
+        for statement in self.INDEXES:
+            c.execute(statement)
+        self.conn.commit()
+
+    def _migrate(self):
+        """Upgrade databases written by older builds (tracked in PRAGMA user_version)."""
+        c = self.conn.cursor()
+        version = c.execute('PRAGMA user_version').fetchone()[0]
+        if version < 1:
+            # v1: ciphertext and nonce stored as raw bytes instead of base64 text
+            rows = c.execute(
+                "SELECT doc_id, encrypted_content, nonce FROM documents "
+                "WHERE typeof(encrypted_content) = 'text'"
+            ).fetchall()
+            c.executemany(
+                'UPDATE documents SET encrypted_content = ?, nonce = ? WHERE doc_id = ?',
+                [(base64.b64decode(r['encrypted_content']), base64.b64decode(r['nonce']),
+                  r['doc_id']) for r in rows]
+            )
+            c.execute('PRAGMA user_version = 1')
+        if version < 2:
+            # v2: search tokens stored as raw 32-byte digests instead of base64url
+            for table, cols in (('search_index', ('token',)),
+                                ('ngram_index', ('token', 'source_keyword_hash'))):
+                for col in cols:
+                    rows = c.execute(
+                        f"SELECT id, {col} FROM {table} WHERE typeof({col}) = 'text'"
+                    ).fetchall()
+                    c.executemany(
+                        f'UPDATE {table} SET {col} = ? WHERE id = ?',
+                        [(base64.urlsafe_b64decode(r[col]), r['id']) for r in rows]
+                    )
+            c.execute('PRAGMA user_version = 2')
+        if version < 3:
+            # v3: index rows reference documents by INTEGER id instead of repeating
+            # the doc_id string; rebuild tables still on the old layout.
+            cols = {r['name'] for r in c.execute('PRAGMA table_info(search_index)')}
+            if 'doc_ref' not in cols:
+                c.execute('DROP INDEX IF EXISTS idx_token')
+                c.execute('DROP INDEX IF EXISTS idx_ngram')
+                for table in ('documents', 'search_index', 'ngram_index'):
+                    c.execute(f'ALTER TABLE {table} RENAME TO {table}_v2')
+                for statement in self.SCHEMA:
+                    c.execute(statement)
+                c.execute('''
+                    INSERT INTO documents (doc_id, encrypted_content, nonce, keyword_count, created_at)
+                    SELECT doc_id, encrypted_content, nonce, keyword_count, created_at
+                    FROM documents_v2
+                ''')
+                c.execute('''
+                    INSERT INTO search_index (token, doc_ref)
+                    SELECT s.token, d.id FROM search_index_v2 s JOIN documents d ON d.doc_id = s.doc_id
+                ''')
+                c.execute('''
+                    INSERT INTO ngram_index (token, doc_ref, source_keyword_hash)
+                    SELECT n.token, d.id, n.source_keyword_hash
+                    FROM ngram_index_v2 n JOIN documents d ON d.doc_id = n.doc_id
+                ''')
+                for table in ('search_index', 'ngram_index', 'documents'):
+                    c.execute(f'DROP TABLE {table}_v2')
+            c.execute('PRAGMA user_version = 3')
+        if version < 4:
+            # v4: token-only indexes replaced by covering (token, doc_ref) INDEXES
+            c.execute('DROP INDEX IF EXISTS idx_token')
+            c.execute('DROP INDEX IF EXISTS idx_ngram')
+            c.execute('PRAGMA user_version = 4')
         self.conn.commit()
 
     def _log(self, action: str, **details):
-        entry = {
-            'action': action,
-            'timestamp': datetime.now().isoformat(),
-            'server_note': 'Server processed opaque tokens. No plaintext accessed.',
-            **details,
-        }
-        self.audit_log.append(entry)
+        self.audit_log.append((time.time(), action, details))
+
+    def recent_events(self, n: int) -> List[Dict]:
+        """The n most recent audit entries, newest first."""
+        with self._lock:
+            return [{
+                'action': action,
+                'timestamp': datetime.fromtimestamp(ts).isoformat(),
+                'server_note': 'Server processed opaque tokens. No plaintext accessed.',
+                **details,
+            } for ts, action, details in islice(reversed(self.audit_log), n)]
 
     # --- Storage ---
 
     def store_document(self, enc_doc: EncryptedDocument):
         """Store an encrypted document and its search tokens."""
-        c = self.conn.cursor()
-        c.execute(
-            'INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?, ?)',
-            (enc_doc.doc_id, enc_doc.encrypted_content, enc_doc.nonce, 0, enc_doc.timestamp)  # keyword_count hidden to prevent info leak
-        )
-        c.execute('DELETE FROM search_index WHERE doc_id = ?', (enc_doc.doc_id,))
-        for token in enc_doc.tokens:
-            c.execute(
-                'INSERT INTO search_index (token, doc_id) VALUES (?, ?)',
-                (token, enc_doc.doc_id)
-            )
-        self.conn.commit()
-        self._log('STORE_DOCUMENT', doc_id=enc_doc.doc_id, tokens_indexed=len(enc_doc.tokens))
+        self.store_documents([enc_doc])
 
-    def store_ngram_tokens(self, doc_id: str, ngram_tokens: List[str], keyword_hash: str):
+    def store_documents(self, enc_docs: List[EncryptedDocument]):
+        """
+        Store many encrypted documents and their tokens in one transaction; a
+        failure part-way rolls the whole batch back. Re-uploads only delete and
+        insert the index rows whose tokens actually changed.
+        """
+        with self._lock:
+            final: Dict[int, set] = {}  # documents.id -> token set after this batch
+            with self.conn:
+                c = self.conn.cursor()
+                for enc_doc in enc_docs:
+                    # Upsert keeps documents.id stable when a doc_id is re-uploaded
+                    c.execute(
+                        '''INSERT INTO documents (doc_id, encrypted_content, nonce, keyword_count, created_at)
+                           VALUES (?, ?, ?, ?, ?)
+                           ON CONFLICT(doc_id) DO UPDATE SET
+                               encrypted_content = excluded.encrypted_content,
+                               nonce = excluded.nonce,
+                               created_at = excluded.created_at''',
+                        (enc_doc.doc_id, enc_doc.encrypted_content, enc_doc.nonce, 0, enc_doc.timestamp)  # keyword_count hidden to prevent info leak
+                    )
+                    final[self._doc_ref(enc_doc.doc_id)] = set(enc_doc.tokens)
+                # Diff against the in-memory mirror of what each document has indexed
+                removed = [(token, ref) for ref, new in final.items()
+                           for token in self._doc_tokens.get(ref, set()) - new]
+                added = [(token, ref) for ref, new in final.items()
+                         for token in new - self._doc_tokens.get(ref, set())]
+                c.executemany('DELETE FROM search_index WHERE token = ? AND doc_ref = ?', removed)
+                self._insert_rows(c, 'INSERT INTO search_index (token, doc_ref)', added)
+            for token, ref in removed:
+                refs = self._postings[token]
+                refs.discard(ref)
+                if not refs:
+                    del self._postings[token]
+            for token, ref in added:
+                self._postings[token].add(ref)
+            self._doc_tokens.update(final)
+            for enc_doc in enc_docs:
+                self._log('STORE_DOCUMENT', doc_id=enc_doc.doc_id, tokens_indexed=len(enc_doc.tokens))
+            self.revision += 1
+
+    INSERT_CHUNK = 500  # rows per multi-row INSERT statement
+
+    def _insert_rows(self, c, insert: str, rows: List[Tuple]):
+        """
+        Run `insert` (an INSERT ... (cols) head) as multi-row VALUES statements
+        of INSERT_CHUNK rows each, so SQLite inserts a whole chunk per step
+        instead of binding and stepping once per row.
+        """
+        if not rows:
+            return
+        group = '(' + ','.join('?' * len(rows[0])) + ')'
+        for i in range(0, len(rows), self.INSERT_CHUNK):
+            chunk = rows[i:i + self.INSERT_CHUNK]
+            c.execute(f"{insert} VALUES {','.join([group] * len(chunk))}",
+                      [value for row in chunk for value in row])
+
+    def _doc_ref(self, doc_id: str) -> Optional[int]:
+        """documents.id for a doc_id, or None if it is not stored."""
+        row = self.conn.execute('SELECT id FROM documents WHERE doc_id = ?', (doc_id,)).fetchone()
+        return row['id'] if row else None
+
+    def store_ngram_tokens(self, doc_id: str, ngram_tokens: List[bytes], keyword_hash: bytes):
         """Store n-gram tokens for fuzzy search."""
-        c = self.conn.cursor()
-        for token in ngram_tokens:
-            c.execute(
-                'INSERT INTO ngram_index (token, doc_id, source_keyword_hash) VALUES (?, ?, ?)',
-                (token, doc_id, keyword_hash)
-            )
-        self.conn.commit()
+        self.store_ngram_tokens_bulk(doc_id, [(ngram_tokens, keyword_hash)])
+
+    def store_ngram_tokens_bulk(self, doc_id: str, pairs: List[Tuple[List[bytes], bytes]]):
+        """
+        Store n-gram tokens for many keywords of one document in a single
+        transaction. pairs: [(ngram_tokens, keyword_hash), ...]
+        The document must already be stored (store_document).
+        """
+        with self._lock:
+            ref = self._doc_ref(doc_id)
+            if ref is None:
+                raise ValueError(f"Unknown document {doc_id!r}: store_document() it first")
+            rows = [(token, ref, keyword_hash)
+                    for ngram_tokens, keyword_hash in pairs
+                    for token in ngram_tokens]
+            with self.conn:
+                self._insert_rows(
+                    self.conn.cursor(),
+                    'INSERT INTO ngram_index (token, doc_ref, source_keyword_hash)',
+                    rows
+                )
+            for token, _, _ in rows:
+                self._ngram_postings[token].add(ref)
+            self._doc_ngrams[ref].update(token for token, _, _ in rows)
+            self.revision += 1
+
+    @staticmethod
+    def _unindex(postings: Dict[bytes, set], doc_tokens: Dict[int, set], ref: int):
+        """Drop one document from a postings map via its reverse token set."""
+        for token in doc_tokens.pop(ref, ()):
+            refs = postings[token]
+            refs.discard(ref)
+            if not refs:
+                del postings[token]
 
     # --- Search ---
 
-    def search_token(self, token: str) -> List[Dict]:
+    def search_token(self, token: bytes) -> List[Dict]:
         """Exact token matching. Returns encrypted documents."""
-        c = self.conn.cursor()
-        c.execute('''
-            SELECT DISTINCT d.doc_id, d.encrypted_content, d.nonce
-            FROM search_index si
-            JOIN documents d ON si.doc_id = d.doc_id
-            WHERE si.token = ?
-        ''', (token,))
-        results = [dict(r) for r in c.fetchall()]
-        self._log('EXACT_SEARCH', token_preview=token[:16] + '...', results_found=len(results))
-        return results
-
-    def search_multi(self, tokens: List[str], operator: str = "AND") -> List[Dict]:
+        with self._lock:
+            results = self._fetch_documents(self._postings.get(token, ()))
+            self._log('EXACT_SEARCH', token_preview=token[:8].hex() + '...', results_found=len(results))
+            return results
+
+    def search_multi(self, tokens: List[bytes], operator: str = "AND") -> List[Dict]:
         """Multi-keyword search with AND/OR logic."""
-        if not tokens:
-            return []
-        c = self.conn.cursor()
-        ph = ','.join(['?'] * len(tokens))
-        if operator == "AND":
-            c.execute(f'''
-                SELECT d.doc_id, d.encrypted_content, d.nonce
-                FROM search_index si
-                JOIN documents d ON si.doc_id = d.doc_id
-                WHERE si.token IN ({ph})
-                GROUP BY d.doc_id
-                HAVING COUNT(DISTINCT si.token) = ?
-            ''', (*tokens, len(tokens)))
-        else:
-            c.execute(f'''
-                SELECT DISTINCT d.doc_id, d.encrypted_content, d.nonce
-                FROM search_index si
-                JOIN documents d ON si.doc_id = d.doc_id
-                WHERE si.token IN ({ph})
-            ''', tokens)
-        results = [dict(r) for r in c.fetchall()]
-        self._log(f'MULTI_SEARCH_{operator}', token_count=len(tokens), results_found=len(results))
-        return results
-
-    def search_fuzzy(self, ngram_tokens: List[str], threshold: float = 0.6) -> List[Dict]:
+        with self._lock:
+            if not tokens:
+                return []
+            # Set algebra over the in-memory postings; smallest list first for AND
+            postings = sorted((self._postings.get(t, set()) for t in set(tokens)), key=len)
+            if operator == "AND":
+                refs = postings[0].intersection(*postings[1:])
+            else:
+                refs = set().union(*postings)
+            results = self._fetch_documents(refs)
+            self._log(f'MULTI_SEARCH_{operator}', token_count=len(tokens), results_found=len(results))
+            return results
+
+    def search_fuzzy(self, ngram_tokens: List[bytes], threshold: float = 0.6) -> List[Dict]:
         """
         Fuzzy search using n-gram token matching.
         Returns documents where >= threshold fraction of n-gram tokens match.
         """
-        if not ngram_tokens:
+        with self._lock:
+            if not ngram_tokens:
+                return []
+            need = max(int(len(ngram_tokens) * threshold), 1)
+            postings = sorted((self._ngram_postings.get(t, set()) for t in set(ngram_tokens)), key=len)
+            # A doc present in `need` of k posting lists must be in one of the
+            # k - need + 1 shortest, so only those are scanned for candidates;
+            # the long (common n-gram) lists are only probed, never walked.
+            cut = len(postings) - need + 1
+            candidates = set().union(*postings[:cut]) if cut > 0 else set()
+            matching_refs = [ref for ref in candidates
+                             if sum(ref in p for p in postings) >= need]
+            results = self._fetch_documents(matching_refs)
+            self._log('FUZZY_SEARCH', ngram_count=len(ngram_tokens), results_found=len(results))
+            return results
+
+    def _fetch_documents(self, refs) -> List[Dict]:
+        """Load the encrypted rows for a set of matched documents.id values."""
+        if not refs:
             return []
-        c = self.conn.cursor()
-        ph = ','.join(['?'] * len(ngram_tokens))
-        c.execute(f'''
-            SELECT ni.doc_id, COUNT(DISTINCT ni.token) as match_count
-            FROM ngram_index ni
-            WHERE ni.token IN ({ph})
-            GROUP BY ni.doc_id
-        ''', ngram_tokens)
-        min_matches = int(len(ngram_tokens) * threshold)
-        matching_doc_ids = [
-            row['doc_id'] for row in c.fetchall()
-            if row['match_count'] >= min_matches
-        ]
-        if not matching_doc_ids:
-            self._log('FUZZY_SEARCH', ngram_count=len(ngram_tokens), results_found=0)
-            return []
-        ph2 = ','.join(['?'] * len(matching_doc_ids))
-        c.execute(f'''
+        # One JSON array parameter instead of an IN (?, ?, ...) list, so the
+        # statement text (and its cached plan) is the same for any result size
+        rows = self.conn.execute('''
             SELECT doc_id, encrypted_content, nonce
             FROM documents
-            WHERE doc_id IN ({ph2})
-        ''', matching_doc_ids)
-        results = [dict(r) for r in c.fetchall()]
-        self._log('FUZZY_SEARCH', ngram_count=len(ngram_tokens), results_found=len(results))
-        return results
+            WHERE id IN (SELECT value FROM json_each(?))
+            ORDER BY doc_id
+        ''', (json.dumps(list(refs)),)).fetchall()
+        return [dict(r) for r in rows]
 
     # --- Inspection (for Security Proof demo) ---
 
     def get_all_documents_raw(self) -> List[Dict]:
         """Return all stored documents (still encrypted)."""
-        c = self.conn.cursor()
-        c.execute('SELECT * FROM documents')
-        return [dict(r) for r in c.fetchall()]
+        with self._lock:
+            rows = self.conn.execute('SELECT doc_id, encrypted_content, nonce, keyword_count, created_at '
+                                     'FROM documents').fetchall()
+            return [dict(r) for r in rows]
 
     def get_all_tokens_raw(self) -> List[Dict]:
         """Return all index entries (opaque tokens)."""
-        c = self.conn.cursor()
-        c.execute('SELECT token, doc_id FROM search_index LIMIT 50')
-        return [dict(r) for r in c.fetchall()]
+        with self._lock:
+            rows = self.conn.execute('SELECT si.token, d.doc_id FROM search_index si '
+                                     'JOIN documents d ON d.id = si.doc_ref LIMIT 50').fetchall()
+            return [dict(r) for r in rows]
 
     def get_stats(self) -> Dict:
-        c = self.conn.cursor()
-        c.execute('SELECT COUNT(*) as n FROM documents')
-        docs = c.fetchone()['n']
-        c.execute('SELECT COUNT(*) as n FROM search_index')
-        idx = c.fetchone()['n']
-        c.execute('SELECT COUNT(DISTINCT token) as n FROM search_index')
-        uniq = c.fetchone()['n']
-        return {
-            'documents': docs,
-            'index_entries': idx,
-            'unique_tokens': uniq,
-            'audit_events': len(self.audit_log),
-        }
+        with self._lock:
+            row = self.conn.execute('''
+                SELECT (SELECT COUNT(*) FROM documents) AS documents,
+                       (SELECT COUNT(*) FROM search_index) AS index_entries,
+                       (SELECT COUNT(DISTINCT token) FROM search_index) AS unique_tokens
+            ''').fetchone()
+            return {**dict(row), 'audit_events': len(self.audit_log)}
 
     def delete_document(self, doc_id: str):
-        c = self.conn.cursor()
-        c.execute('DELETE FROM search_index WHERE doc_id = ?', (doc_id,))
-        c.execute('DELETE FROM ngram_index WHERE doc_id = ?', (doc_id,))
-        c.execute('DELETE FROM documents WHERE doc_id = ?', (doc_id,))
-        self.conn.commit()
-        self._log('DELETE', doc_id=doc_id)
+        with self._lock:
+            ref = self._doc_ref(doc_id)
+            c = self.conn.cursor()
+            c.execute('DELETE FROM search_index WHERE doc_ref = ?', (ref,))
+            c.execute('DELETE FROM ngram_index WHERE doc_ref = ?', (ref,))
+            c.execute('DELETE FROM documents WHERE id = ?', (ref,))
+            self.conn.commit()
+            self._unindex(self._postings, self._doc_tokens, ref)
+            self._unindex(self._ngram_postings, self._doc_ngrams, ref)
+            self.revision += 1
+            self._log('DELETE', doc_id=doc_id)
 
     def clear_all(self):
-        c = self.conn.cursor()
-        c.execute('DELETE FROM search_index')
-        c.execute('DELETE FROM ngram_index')
-        c.execute('DELETE FROM documents')
-        self.conn.commit()
-        self.audit_log.clear()
+        with self._lock:
+            c = self.conn.cursor()
+            c.execute('DELETE FROM search_index')
+            c.execute('DELETE FROM ngram_index')
+            c.execute('DELETE FROM documents')
+            self.conn.commit()
+            self._postings.clear()
+            self._doc_tokens.clear()
+            self._ngram_postings.clear()
+            self._doc_ngrams.clear()
+            self.revision += 1
+            self.audit_log.clear()
 
 
 # ---------------------------------------------------------------------------
@@ -445,27 +838,27 @@ if __name__ == "__main__":
         server.store_document(enc)
         print(f"  [OK] {doc_id}: {enc.keyword_count} keywords -> "
               f"{len(enc.tokens)} tokens | "
-              f"ciphertext: {enc.encrypted_content[:40]}...")
+              f"ciphertext: {base64.b64encode(enc.encrypted_content)[:40].decode()}...")
 
     print("\n[SEARCH] Searching for 'diabetes'...\n")
     token = engine.generate_token("diabetes")
-    print(f"  Token: {token[:40]}...")
+    print(f"  Token: {token.hex()[:40]}...")
     results = server.search_token(token)
     print(f"  Found {len(results)} encrypted result(s)")
     for r in results:
-        plain = engine.decrypt_text(r['encrypted_content'], r['nonce'], r['doc_id'])
+        plain = engine.decrypt_raw(r['encrypted_content'], r['nonce'], r['doc_id'])
         print(f"  [DOC] {r['doc_id']}: {plain[:80]}...")
 
     print("\n[SEARCH] Multi-keyword AND search: 'diabetes' + 'metformin'...\n")
-    tokens = [engine.generate_token("diabetes"), engine.generate_token("metformin")]
+    tokens = engine.generate_tokens(["diabetes", "metformin"])
     results = server.search_multi(tokens, "AND")
     print(f"  Found {len(results)} result(s)")
     for r in results:
-        plain = engine.decrypt_text(r['encrypted_content'], r['nonce'], r['doc_id'])
+        plain = engine.decrypt_raw(r['encrypted_content'], r['nonce'], r['doc_id'])
         print(f"  [DOC] {r['doc_id']}: {plain[:80]}...")
 
     print("\n[SECURITY] Server's view (what an attacker sees):")
     for d in server.get_all_documents_raw():
-        print(f"  {d['doc_id']}: {d['encrypted_content'][:50]}... [UNREADABLE]")
+        print(f"  {d['doc_id']}: {base64.b64encode(d['encrypted_content'])[:50].decode()}... [UNREADABLE]")
 
     print("\n[DONE] Demo complete. Server never saw any plaintext.")
\ No newline at end of file
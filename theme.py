@@ -5,6 +5,10 @@ Enhanced theme with dark mode, improved accessibility, and modern design element
 Applies to ALL pages: Login, Dashboard, Upload, Search, Security Proof, Benchmark.
 """
 
+import re
+from functools import lru_cache
+
+
 CIPHERSEARCH_CSS = """
 @import url('https://fonts.googleapis.com/css2?family=Plus+Jakarta+Sans:wght@300;400;500;600;700&family=JetBrains+Mono:wght@400;500;600&display=swap');
 
@@ -73,7 +77,6 @@ CIPHERSEARCH_CSS = """
   --shadow-md:      0 4px 6px -1px rgba(0, 0, 0, 0.1), 0 2px 4px -1px rgba(0, 0, 0, 0.06);
   --shadow-lg:      0 10px 15px -3px rgba(0, 0, 0, 0.1), 0 4px 6px -2px rgba(0, 0, 0, 0.05);
   --shadow-xl:      0 20px 25px -5px rgba(0, 0, 0, 0.1), 0 10px 10px -5px rgba(0, 0, 0, 0.04);
-  --shadow-glow:    0 0 20px rgba(13, 148, 136, 0.3);
 
   /* Typography */
   --font-sans:      'Plus Jakarta Sans', -apple-system, BlinkMacSystemFont, 'Segoe UI', sans-serif;
@@ -86,10 +89,12 @@ CIPHERSEARCH_CSS = """
   --radius-xl:      16px;
   --radius-2xl:     24px;
 
-  /* Transitions */
-  --transition-fast: all 0.15s cubic-bezier(0.4, 0, 0.2, 1);
-  --transition-normal: all 0.2s cubic-bezier(0.4, 0, 0.2, 1);
-  --transition-slow: all 0.3s cubic-bezier(0.4, 0, 0.2, 1);
+  /* Transitions — only the properties hover/focus states change, instead of
+     `all` (which diffs every computed property on every frame) */
+  --ease: cubic-bezier(0.4, 0, 0.2, 1);
+  --transition-fast: background-color 0.15s var(--ease), border-color 0.15s var(--ease), box-shadow 0.15s var(--ease), color 0.15s var(--ease), opacity 0.15s var(--ease), transform 0.15s var(--ease);
+  --transition-normal: background-color 0.2s var(--ease), border-color 0.2s var(--ease), box-shadow 0.2s var(--ease), color 0.2s var(--ease), opacity 0.2s var(--ease), transform 0.2s var(--ease);
+  --transition-slow: background-color 0.3s var(--ease), border-color 0.3s var(--ease), box-shadow 0.3s var(--ease), color 0.3s var(--ease), opacity 0.3s var(--ease), transform 0.3s var(--ease);
 }
 
 /* Dark theme override */
@@ -130,7 +135,6 @@ CIPHERSEARCH_CSS = """
   --shadow-md:      0 4px 6px -1px rgba(0, 0, 0, 0.4), 0 2px 4px -1px rgba(0, 0, 0, 0.3);
   --shadow-lg:      0 10px 15px -3px rgba(0, 0, 0, 0.5), 0 4px 6px -2px rgba(0, 0, 0, 0.4);
   --shadow-xl:      0 20px 25px -5px rgba(0, 0, 0, 0.6), 0 10px 10px -5px rgba(0, 0, 0, 0.5);
-  --shadow-glow:    0 0 20px rgba(13, 148, 136, 0.4);
 
   --gradient-surface: linear-gradient(135deg, rgba(255, 255, 255, 0.05) 0%, rgba(255, 255, 255, 0.02) 100%);
 }
@@ -171,7 +175,6 @@ CIPHERSEARCH_CSS = """
   background: var(--sidebar-bg) !important;
   border-right: 1px solid var(--border-light) !important;
   padding-top: 1.5rem !important;
-  backdrop-filter: blur(12px) !important;
   transition: var(--transition-normal) !important;
 }
 
@@ -227,13 +230,6 @@ CIPHERSEARCH_CSS = """
   transform: translateX(4px) !important;
 }
 
-[data-testid="stSidebar"] .stRadio > div > label:has(input:checked) {
-  background: var(--accent-primary-dim) !important;
-  border-color: rgba(13, 148, 136, 0.35) !important;
-  box-shadow: 0 0 0 2px var(--accent-primary-glow), var(--shadow-sm) !important;
-  transform: translateX(4px) !important;
-}
-
 [data-testid="stSidebar"] .stRadio label span {
   font-family: var(--font-sans) !important;
   font-size: 14px !important;
@@ -243,11 +239,6 @@ CIPHERSEARCH_CSS = """
   z-index: 1 !important;
 }
 
-[data-testid="stSidebar"] .stRadio label:has(input:checked) span {
-  color: var(--accent-primary) !important;
-  font-weight: 600 !important;
-}
-
 [data-testid="stSidebar"] [data-testid="stSuccess"],
 [data-testid="stSidebar"] [data-testid="stError"] {
   padding: 8px 12px !important;
@@ -311,17 +302,25 @@ CIPHERSEARCH_CSS = """
 }
 
 /* ──────────────────────────────────────────────────────────────────
-   METRIC CARDS — Enhanced with glassmorphism effect
+   CARD SURFACE — shared by metric cards, radio groups, expander headers
+   (declared once; each component below adds only what differs)
    ────────────────────────────────────────────────────────────────── */
-div[data-testid="stMetric"] {
+div[data-testid="stMetric"],
+.stRadio > div,
+.streamlit-expanderHeader {
   background: var(--surface) !important;
   border: 1px solid var(--border-light) !important;
+  box-shadow: var(--shadow-sm) !important;
+}
+
+/* ──────────────────────────────────────────────────────────────────
+   METRIC CARDS — Enhanced with glassmorphism effect
+   ────────────────────────────────────────────────────────────────── */
+div[data-testid="stMetric"] {
   border-radius: var(--radius-xl) !important;
   padding: 24px !important;
   text-align: center !important;
   transition: var(--transition-slow) !important;
-  box-shadow: var(--shadow-sm) !important;
-  backdrop-filter: blur(12px) !important;
   position: relative !important;
   overflow: hidden !important;
 }
@@ -396,6 +395,8 @@ div[data-testid="stMetric"] [data-testid="stMetricValue"] {
   color: var(--text-inverse) !important;
   box-shadow: var(--shadow-md) !important;
   position: relative !important;
+  /* Hover also brightens via filter, which --transition-fast doesn't list */
+  transition: var(--transition-fast), filter 0.15s var(--ease) !important;
 }
 
 .stButton > button[kind="primary"]::before {
@@ -458,7 +459,6 @@ div[data-testid="stMetric"] [data-testid="stMetricValue"] {
   border-color: var(--accent-primary) !important;
   box-shadow: 0 0 0 3px var(--accent-primary-glow), var(--shadow-md) !important;
   outline: none !important;
-  transform: translateY(-1px) !important;
 }
 
 .stTextInput input::placeholder, .stTextArea textarea::placeholder {
@@ -470,12 +470,8 @@ div[data-testid="stMetric"] [data-testid="stMetricValue"] {
    RADIO / TABS — Enhanced with better visual feedback
    ────────────────────────────────────────────────────────────────── */
 .stRadio > div {
-  background: var(--surface) !important;
-  border: 1px solid var(--border-light) !important;
   border-radius: var(--radius-xl) !important;
   padding: 8px !important;
-  box-shadow: var(--shadow-sm) !important;
-  backdrop-filter: blur(8px) !important;
 }
 
 .stRadio label {
@@ -493,14 +489,6 @@ div[data-testid="stMetric"] [data-testid="stMetricValue"] {
 .stRadio label:hover {
   color: var(--text-primary) !important;
   background: var(--accent-primary-dim) !important;
-  transform: translateY(-1px) !important;
-}
-
-.stRadio label:has(input:checked) {
-  background: var(--gradient-primary) !important;
-  color: var(--text-inverse) !important;
-  box-shadow: var(--shadow-sm) !important;
-  font-weight: 600 !important;
 }
 
 /* ──────────────────────────────────────────────────────────────────
@@ -514,44 +502,21 @@ div[data-testid="stMetric"] [data-testid="stMetricValue"] {
   padding: 16px 20px !important;
   margin: 12px 0 !important;
   box-shadow: var(--shadow-sm) !important;
-  backdrop-filter: blur(8px) !important;
   position: relative !important;
   overflow: hidden !important;
 }
 
-.stAlert::before {
-  content: '' !important;
-  position: absolute !important;
-  top: 0 !important;
-  left: 0 !important;
-  width: 4px !important;
-  height: 100% !important;
-  background: var(--gradient-primary) !important;
-}
-
-[data-testid="stAlert"][data-baseweb="notification"][kind="info"] {
-  background: var(--info-dim) !important;
-  border-color: var(--info-light) !important;
-  color: var(--info) !important;
-}
-
-[data-testid="stAlert"][data-baseweb="notification"][kind="success"] {
-  background: var(--success-dim) !important;
-  border-color: var(--success-light) !important;
-  color: var(--success) !important;
-}
-
-[data-testid="stAlert"][data-baseweb="notification"][kind="error"] {
-  background: var(--error-dim) !important;
-  border-color: var(--error-light) !important;
-  color: var(--error) !important;
-}
-
-[data-testid="stAlert"][data-baseweb="notification"][kind="warning"] {
-  background: var(--warning-dim) !important;
-  border-color: var(--warning-light) !important;
-  color: var(--warning) !important;
+/* One rule for every alert kind; each kind only sets its colour family */
+[data-testid="stAlert"][data-baseweb="notification"] {
+  background: var(--alert-dim) !important;
+  border-color: var(--alert-light) !important;
+  border-left: 4px solid var(--alert) !important;
+  color: var(--alert) !important;
 }
+[data-testid="stAlert"][kind="info"]    { --alert: var(--info);    --alert-dim: var(--info-dim);    --alert-light: var(--info-light); }
+[data-testid="stAlert"][kind="success"] { --alert: var(--success); --alert-dim: var(--success-dim); --alert-light: var(--success-light); }
+[data-testid="stAlert"][kind="error"]   { --alert: var(--error);   --alert-dim: var(--error-dim);   --alert-light: var(--error-light); }
+[data-testid="stAlert"][kind="warning"] { --alert: var(--warning); --alert-dim: var(--warning-dim); --alert-light: var(--warning-light); }
 
 /* ──────────────────────────────────────────────────────────────────
    CODE BLOCKS & EXPANDERS — Enhanced styling
@@ -568,35 +533,18 @@ div[data-testid="stMetric"] [data-testid="stMetricValue"] {
   position: relative !important;
 }
 
-.stCodeBlock::before {
-  content: 'Code' !important;
-  position: absolute !important;
-  top: 8px !important;
-  right: 12px !important;
-  font-size: 10px !important;
-  font-weight: 600 !important;
-  color: var(--text-muted) !important;
-  text-transform: uppercase !important;
-  letter-spacing: 0.08em !important;
-}
-
 .streamlit-expanderHeader {
-  background: var(--surface) !important;
-  border: 1px solid var(--border-light) !important;
   border-radius: var(--radius-lg) !important;
   color: var(--text-primary) !important;
   font-family: var(--font-sans) !important;
   font-weight: 500 !important;
   transition: var(--transition-fast) !important;
-  box-shadow: var(--shadow-sm) !important;
-  backdrop-filter: blur(8px) !important;
   padding: 16px 20px !important;
 }
 
 .streamlit-expanderHeader:hover {
   background: var(--surface-hover) !important;
   border-color: var(--border-medium) !important;
-  transform: translateY(-1px) !important;
   box-shadow: var(--shadow-md) !important;
 }
 
@@ -608,6 +556,16 @@ div[data-testid="stMetric"] [data-testid="stMetricValue"] {
   padding: 20px !important;
 }
 
+/* Off-screen code blocks and expander bodies skip layout and paint until
+   they near the viewport; "auto" keeps their last rendered height */
+@supports (content-visibility: auto) {
+  .stCodeBlock,
+  .streamlit-expanderContent {
+    content-visibility: auto;
+    contain-intrinsic-size: auto 200px;
+  }
+}
+
 /* ──────────────────────────────────────────────────────────────────
    PROGRESS BARS — Enhanced visual feedback
    ────────────────────────────────────────────────────────────────── */
@@ -615,7 +573,6 @@ div[data-testid="stMetric"] [data-testid="stMetricValue"] {
   background: var(--gradient-primary) !important;
   border-radius: var(--radius-sm) !important;
   transition: width 0.3s ease !important;
-  box-shadow: 0 0 10px var(--accent-primary-glow) !important;
 }
 
 .stProgress > div {
@@ -624,6 +581,132 @@ div[data-testid="stMetric"] [data-testid="stMetricValue"] {
   height: 8px !important;
 }
 
+/* ──────────────────────────────────────────────────────────────────
+   RESPONSIVE DESIGN
+   ────────────────────────────────────────────────────────────────── */
+@media (max-width: 768px) {
+  .main .block-container {
+    padding: 1rem !important;
+  }
+
+  div[data-testid="stMetric"] {
+    padding: 16px !important;
+  }
+
+  [data-testid="stSidebar"] {
+    width: 280px !important;
+  }
+}
+
+@media (max-width: 480px) {
+  .main h1 {
+    font-size: 24px !important;
+  }
+
+  .stButton > button {
+    padding: 10px 20px !important;
+    font-size: 13px !important;
+  }
+}
+
+/* ──────────────────────────────────────────────────────────────────
+   ACCESSIBILITY IMPROVEMENTS
+   ────────────────────────────────────────────────────────────────── */
+@media (prefers-reduced-motion: reduce) {
+  /* Only the elements this theme animates, not every node in the tree */
+  .stApp,
+  [data-testid="stSidebar"],
+  [data-testid="stSidebar"] .stRadio > div > label,
+  [data-testid="stSidebar"] .stRadio > div > label::before,
+  div[data-testid="stMetric"],
+  div[data-testid="stMetric"]::before,
+  .stButton > button,
+  .stButton > button[kind="primary"],
+  .stButton > button[kind="primary"]::before,
+  .stTextInput input, .stTextArea textarea,
+  .stRadio label,
+  .streamlit-expanderHeader,
+  .stProgress > div > div,
+  .fade-in {
+    animation: none !important;
+    transition: none !important;
+  }
+}
+
+*:focus-visible {
+  outline: 2px solid var(--accent-primary) !important;
+  outline-offset: 2px !important;
+}
+
+/* High contrast mode support: darker borders on the light palette, lighter
+   ones under the dark override; one block, evaluated once per media change */
+@media (prefers-contrast: more) {
+  :root {
+    --border-light: rgba(15, 23, 42, 0.3);
+    --border-medium: rgba(15, 23, 42, 0.5);
+    --border-strong: rgba(15, 23, 42, 0.7);
+  }
+
+  [data-theme="dark"] {
+    --border-light: rgba(255, 255, 255, 0.3);
+    --border-medium: rgba(255, 255, 255, 0.5);
+    --border-strong: rgba(255, 255, 255, 0.7);
+  }
+}
+
+/* ──────────────────────────────────────────────────────────────────
+   SCROLLBAR & UTILITIES
+   ────────────────────────────────────────────────────────────────── */
+/* Scoped to the app root so the matcher skips everything outside it */
+.stApp ::-webkit-scrollbar {
+  width: 8px;
+  height: 8px;
+}
+
+.stApp ::-webkit-scrollbar-track {
+  background: var(--bg-tertiary);
+  border-radius: var(--radius-sm);
+}
+
+.stApp ::-webkit-scrollbar-thumb {
+  background: var(--text-muted);
+  border-radius: var(--radius-sm);
+  transition: var(--transition-fast);
+}
+
+.stApp ::-webkit-scrollbar-thumb:hover {
+  background: var(--text-tertiary);
+}
+
+.stApp hr {
+  border: none !important;
+  height: 1px !important;
+  background: var(--border-light) !important;
+  margin: 2rem 0 !important;
+}
+
+/* Compliance checklist rows — state carried by .ok / .bad */
+.check-row {
+  display: flex;
+  align-items: center;
+  gap: 12px;
+  padding: 8px 14px;
+  border-radius: 8px;
+  margin-bottom: 4px;
+}
+.check-row.ok  { background: rgba(16, 185, 129, 0.05); }
+.check-row.bad { background: rgba(244, 63, 94, 0.05); }
+.check-row .check-icon  { font-size: 15px; }
+.check-row .check-label {
+  font-family: Outfit, sans-serif;
+  font-size: 13px;
+  color: #8fa3b1;
+}
+"""
+
+# Only the login route renders these, so they ship with LOGIN_STYLE instead
+# of riding along on every page of the signed-in app.
+LOGIN_CSS = """
 /* ──────────────────────────────────────────────────────────────────
    LOGIN PAGE — Enhanced with modern design
    ────────────────────────────────────────────────────────────────── */
@@ -711,9 +794,7 @@ div[data-testid="stMetric"] [data-testid="stMetricValue"] {
   margin-top: 8px !important;
 }
 
-/* ──────────────────────────────────────────────────────────────────
-   ANIMATIONS & MICRO-INTERACTIONS
-   ────────────────────────────────────────────────────────────────── */
+/* Entrance animation for the login card */
 @keyframes fadeInUp {
   from {
     opacity: 0;
@@ -725,165 +806,81 @@ div[data-testid="stMetric"] [data-testid="stMetricValue"] {
   }
 }
 
-@keyframes slideInRight {
-  from {
-    opacity: 0;
-    transform: translateX(24px);
-  }
-  to {
-    opacity: 1;
-    transform: translateX(0);
-  }
-}
-
-@keyframes pulse {
-  0%, 100% {
-    opacity: 1;
-  }
-  50% {
-    opacity: 0.7;
-  }
-}
-
-@keyframes shimmer {
-  0% {
-    background-position: -200px 0;
-  }
-  100% {
-    background-position: calc(200px + 100%) 0;
-  }
-}
-
 .fade-in {
   animation: fadeInUp 0.6s cubic-bezier(0.4, 0, 0.2, 1) forwards;
 }
 
-.slide-in {
-  animation: slideInRight 0.5s cubic-bezier(0.4, 0, 0.2, 1) forwards;
-}
-
-.pulse {
-  animation: pulse 2s infinite;
-}
-
-.loading-shimmer {
-  background: linear-gradient(90deg, var(--bg-tertiary) 25%, var(--surface-hover) 50%, var(--bg-tertiary) 75%);
-  background-size: 200px 100%;
-  animation: shimmer 1.5s infinite;
-}
-
-/* ──────────────────────────────────────────────────────────────────
-   RESPONSIVE DESIGN
-   ────────────────────────────────────────────────────────────────── */
 @media (max-width: 768px) {
-  .main .block-container {
-    padding: 1rem !important;
-  }
-
   .login-box {
     margin: 1rem !important;
     padding: 24px !important;
   }
-
-  div[data-testid="stMetric"] {
-    padding: 16px !important;
-  }
-
-  [data-testid="stSidebar"] {
-    width: 280px !important;
-  }
 }
 
 @media (max-width: 480px) {
-  .main h1 {
-    font-size: 24px !important;
-  }
-
   .login-box {
     padding: 20px !important;
   }
-
-  .stButton > button {
-    padding: 10px 20px !important;
-    font-size: 13px !important;
-  }
 }
+"""
 
-/* ──────────────────────────────────────────────────────────────────
-   ACCESSIBILITY IMPROVEMENTS
-   ────────────────────────────────────────────────────────────────── */
-@media (prefers-reduced-motion: reduce) {
-  *, *::before, *::after {
-    animation-duration: 0.01ms !important;
-    animation-iteration-count: 1 !important;
-    transition-duration: 0.01ms !important;
-  }
+# Selected radio option, keyed by position: app.py passes the indices it
+# already holds in session state, so no label:has(input:checked) rule makes
+# every radio subtree re-match on each input change. Options are the
+# radiogroup's children: a <label> on older Streamlit, a RadioField <div>
+# wrapping it on current releases, hence :nth-child(), not label:nth-of-type().
+# The page's main area is [data-testid="stMain"] now, .main before that.
+CHECKED_RADIO_CSS = """
+[data-testid="stSidebar"] [role="radiogroup"] > :nth-child(%(nav)d) {
+  background: var(--accent-primary-dim) !important;
+  border-color: rgba(13, 148, 136, 0.35) !important;
+  box-shadow: 0 0 0 2px var(--accent-primary-glow), var(--shadow-sm) !important;
+  transform: translateX(4px) !important;
 }
 
-*:focus-visible {
-  outline: 2px solid var(--accent-primary) !important;
-  outline-offset: 2px !important;
+[data-testid="stSidebar"] [role="radiogroup"] > :nth-child(%(nav)d) span {
+  color: var(--accent-primary) !important;
+  font-weight: 600 !important;
 }
 
-/* High contrast mode support */
-@media (prefers-contrast: high) {
-  :root {
-    --border-light: rgba(255, 255, 255, 0.2);
-    --border-medium: rgba(255, 255, 255, 0.4);
-    --border-strong: rgba(255, 255, 255, 0.6);
-  }
-
-  [data-theme="dark"] {
-    --border-light: rgba(0, 0, 0, 0.3);
-    --border-medium: rgba(0, 0, 0, 0.5);
-    --border-strong: rgba(0, 0, 0, 0.7);
-  }
+:is([data-testid="stMain"], .main) [role="radiogroup"] > :nth-child(%(main)d) {
+  background: var(--gradient-primary) !important;
+  color: var(--text-inverse) !important;
+  box-shadow: var(--shadow-sm) !important;
+  font-weight: 600 !important;
 }
+"""
 
-/* ──────────────────────────────────────────────────────────────────
-   SCROLLBAR & UTILITIES
-   ────────────────────────────────────────────────────────────────── */
-::-webkit-scrollbar {
-  width: 8px;
-  height: 8px;
-}
 
-::-webkit-scrollbar-track {
-  background: var(--bg-tertiary);
-  border-radius: var(--radius-sm);
-}
+# Quoted strings (attribute values, font names) split out of the stylesheet
+_CSS_STRING = re.compile(r"""("[^"]*"|'[^']*')""")
 
-::-webkit-scrollbar-thumb {
-  background: var(--text-muted);
-  border-radius: var(--radius-sm);
-  transition: var(--transition-fast);
-}
 
-::-webkit-scrollbar-thumb:hover {
-  background: var(--text-tertiary);
-}
+def _minify(css: str) -> str:
+    """
+    Strip comments, redundant whitespace and leading zeros. Quoted strings
+    are passed through as written; calc() needs no guard, since the spaces
+    around its + and - operators are never removed.
+    """
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    parts = _CSS_STRING.split(css)
+    for i in range(0, len(parts), 2):  # even slots sit outside quotes
+        code = re.sub(r"\s+", " ", parts[i])
+        code = re.sub(r"\s*([{};,>])\s*", r"\1", code)
+        code = code.replace(": ", ":").replace(" !important", "!important").replace(";}", "}")
+        parts[i] = re.sub(r"(?<![\w.])0\.(\d)", r".\1", code)  # 0.08 -> .08
+    return "".join(parts).strip()
 
-hr {
-  border: none !important;
-  height: 1px !important;
-  background: var(--border-light) !important;
-  margin: 2rem 0 !important;
-}
 
-/* Utility classes */
-.glass-effect {
-  backdrop-filter: blur(12px) !important;
-  background: var(--gradient-surface) !important;
-}
+# Built once at import; the app re-sends this every rerun (Streamlit drops
+# elements a rerun doesn't emit), so keeping it small is what counts.
+CIPHERSEARCH_STYLE = f"<style>{_minify(CIPHERSEARCH_CSS)}</style>"
+LOGIN_STYLE = f"<style>{_minify(LOGIN_CSS)}</style>"
 
-.shadow-glow {
-  box-shadow: var(--shadow-glow) !important;
-}
 
-.text-gradient {
-  background: var(--gradient-primary) !important;
-  -webkit-background-clip: text !important;
-  -webkit-text-fill-color: transparent !important;
-  background-clip: text !important;
-}
-"""
+@lru_cache(maxsize=None)
+def checked_radio_style(nav_index: int, main_index: int) -> str:
+    """<style> highlighting option nav_index of the sidebar radio and
+    main_index of the page's radio (both 0-based)."""
+    css = CHECKED_RADIO_CSS % {"nav": nav_index + 1, "main": main_index + 1}
+    return f"<style>{_minify(css)}</style>"